@@ -9,13 +9,18 @@
 # Last modification : 2015-10-13
 # -----------------------------------------------------------------------------
 
-import os, stat, sys, dbm, argparse, shutil, fnmatch
+import os, stat, sys, dbm, argparse, shutil, fnmatch, errno, time, json, select, struct
 
 try:
 	import reporter as logging
 except:
 	import logging
 
+try:
+	import ctypes, ctypes.util
+except ImportError:
+	ctypes = None
+
 __version__  = "0.3.0"
 LICENSE      = "http://ffctn.com/doc/licenses/bsd"
 TYPE_BASE    = "B"
@@ -180,6 +185,48 @@ rawcopy -r2553338- -o <OUTPUT PATH> <PATH TO COPY>...
 Note that the trailing `-` is important as otherwise only that specific
 file will be copied.
 
+### Copying only some directories
+
+Along with the catalogue, rawcopy writes an index of the catalogue's
+directories (`__rawcopy__/catalogue.lst.idx`). The `-p PATH` option (which
+can be repeated) uses it to only process the directories within the given
+paths, absolute or relative to the base, without going through the rest of
+the catalogue:
+
+```
+$ rawcopy -p 20111227-164323-320 /mnt/backups -o /mnt/new-backup
+```
+
+The paths can also be files or symlinks. A warning is logged when no entry
+of the catalogue is within them. The selection also applies to `-E`, which
+then only retries the failed entries within the paths, and to `-w`, which
+then only watches them.
+
+Files that are hard links to files outside of the selected paths are still
+copied as hard links if these were already copied.
+
+### Resuming an interrupted catalogue
+
+Creating the catalogue of a very large tree can take hours. While it is
+being created, rawcopy regularly saves its position in
+`__rawcopy__/catalogue.lst.state`. If the catalogue creation is interrupted,
+running the same command again (with or without `-C`) resumes it from the
+last completed directory, producing the same catalogue as an uninterrupted
+run. Remove the `.state` file to start over instead.
+
+### Faster resumes
+
+By default, rawcopy checks that each catalogue entry exists in the source
+and in the output, which costs several `stat` calls per entry when resuming
+or re-running over an already copied tree. With the `-I` option, each output
+directory is listed once and kept in an in-memory index, and the sources are
+expected to match the catalogue, so that only files are still checked (to
+keep the hard links map up to date):
+
+```
+$ rawcopy -I /mnt/a -o /mnt/b
+```
+
 ### Updating a previously rawcopy'ed directory
 
 Imaging that you've already rawcopy'ed `/mnt/a` to `/mnt/b`, but since then
@@ -200,6 +247,62 @@ already exists. Once this is done, you can start/resume the copy as usual:
 $ rawcopy /mnt/a -o /mnt/b
 ```
 
+### Not halting on errors
+
+When copying from a flaky drive, a few unreadable files or directories should
+not abort the whole run. With the `-k` option, failures are recorded in
+`__rawcopy__/errors.lst` (along with their errno and the phase in which they
+happened) and the copy moves on. Transient errors (such as `EIO`) are retried
+with an increasing delay at the end of the run (see `--retries`):
+
+```
+$ rawcopy -k /mnt/a -o /mnt/b
+```
+
+The entries that still failed can later be processed on their own, without
+going through the catalogue again:
+
+```
+$ rawcopy -E /mnt/a -o /mnt/b
+```
+
+### Limiting the impact on a live system
+
+When the source or destination is also serving other processes, the copied
+bytes per second and the filesystem operations per second can be limited:
+
+```
+$ rawcopy --bandwidth 20M --iops 500 /mnt/a -o /mnt/b
+```
+
+The limits are stored in `__rawcopy__/throttle.json` as `bytes` and `ops`
+per second and `latency` in milliseconds. The file is checked every second
+and can be edited while rawcopy runs (a `0` value means no limit), and the
+limits given on the command line, including `0`, replace the ones it
+holds. The `--latency MS` option enables an adaptive mode in which rawcopy
+slows down whenever the observed latency of its operations rises above the
+given number of milliseconds.
+
+### Keeping a copy in sync
+
+On Linux, the `-w` option keeps the output in sync with the sources after the
+copy, until rawcopy is interrupted. The changes to the sources are collected
+through inotify and applied every `--watch-interval` seconds: new entries are
+copied (new hard links are created as links), modified files are rewritten,
+and moved or deleted entries are moved or deleted in the output. The changes
+happening during the initial copy are applied once it is done, and when
+events are lost (the kernel's event queue overflowed), the sources are
+compared with the output to find the changes. As entries might disappear
+while they are copied, `-w` implies `-k`.
+
+```
+$ rawcopy -w /mnt/a -o /mnt/b
+```
+
+Note that each watched directory uses one inotify watch, so you might need to
+increase `fs.inotify.max_user_watches` for large trees: rawcopy stops before
+the copy when the sources can't all be watched.
+
 Acknowledgments
 ---------------
 
@@ -211,13 +314,11 @@ with the suprisingly hard problem of copy directory trees with hard links.
 """
 
 # NOTE: os.path.exists() fails when symlink has unreachable target
-# TODO: Option (on by default) to not halt on error (Permissin, InputOuput, etc) but log them
 # TODO: Option to resume from a given path
 # TODO: Include and exclude patterns
 # TODO: Implement fast resume from catalogue (skip ahead to find the last index
 # -- or simply store the last offset).
 # TODO: Allow to use kyoto cabinet, which should be faster
-# TODO: Implement resuming of catalogue
 # TODO: Implement a dedup pass that goes over the catalogue and de-duplicates
 # everything creating hard links for existing file signatures (and guarding
 # against possible collisions)
@@ -240,6 +341,294 @@ def utf8(s):
 	"""Ensures that the given string is in UTF-8"""
 	return s.encode("utf8", "replace").decode("utf8")
 
+def size( s ):
+	"""Parses the given size string, which might be suffixed with `K`, `M`
+	or `G`, returning the corresponding number of bytes."""
+	s = s.strip().upper()
+	for i, suffix in enumerate("KMG"):
+		if s.endswith(suffix):
+			return int(float(s[:-1]) * (1024 ** (i + 1)))
+	return int(float(s))
+
+# -----------------------------------------------------------------------------
+#
+# ERRORS
+#
+# -----------------------------------------------------------------------------
+
+class Errors(object):
+	"""A persistent list of the entries that failed during a run. Each
+	failure is stored as an `(index, phase, errno, type, path)` line, where
+	`phase` is one of `PHASES` and `path` is the absolute source path. The
+	list is appended to as failures happen, so that it survives an
+	interrupted run."""
+
+	FIELD_SEPARATOR = chr(31)
+	LINE_SEPARATOR  = "\n"
+	PHASE_CATALOGUE = "catalogue"
+	PHASE_ROOT      = "root"
+	PHASE_DIR       = "dir"
+	PHASE_FILE      = "file"
+	PHASE_LINK      = "link"
+	PHASE_ATTR      = "attr"
+	PHASES          = (PHASE_CATALOGUE, PHASE_ROOT, PHASE_DIR, PHASE_FILE, PHASE_LINK, PHASE_ATTR)
+	# These are the errors that might go away if we try again a bit later,
+	# the others (permissions, vanished files) are simply recorded.
+	TRANSIENT       = (errno.EIO, errno.EAGAIN, errno.EBUSY, errno.EINTR, errno.ETIMEDOUT, errno.ESTALE)
+
+	def __init__( self, path, retries=3, backoff=1.0 ):
+		self.path    = path
+		self.retries = retries
+		self.backoff = backoff
+		self.entries = {}
+		self.load()
+
+	def load( self ):
+		"""Loads the entries from the error list, if it exists."""
+		self.entries = {}
+		if not os.path.exists(self.path): return self
+		with open(self.path, "r", encoding="utf8", errors="surrogateescape") as f:
+			for line in f:
+				fields = line[:-1].split(self.FIELD_SEPARATOR, 4)
+				if len(fields) != 5:
+					logging.error("Errors: malformed line: {0}".format(repr(line)))
+					continue
+				i, phase, code, t, p = fields
+				self.entries[(phase, p)] = (int(i), phase, int(code), t, p)
+		return self
+
+	def add( self, index, phase, error, type, path ):
+		"""Records the given `error` (an `OSError`) for the entry at the given
+		`index`, `type` and `path` during the given `phase`."""
+		assert phase in self.PHASES
+		code  = error.errno or 0
+		entry = (index, phase, code, type, path)
+		logging.error("Errors: {0} failed [{1}] {2}:{3} -- {4}".format(phase, errno.errorcode.get(code, code), index, utf8(path), error))
+		self.entries[(phase, path)] = entry
+		self._ensureDirectory()
+		with open(self.path, "ab") as f:
+			f.write(self._line(entry))
+		return entry
+
+	def remove( self, phase, path ):
+		"""Removes the entry for the given phase and path, returning it if it
+		was there."""
+		return self.entries.pop((phase, path), None)
+
+	def clear( self, phase=None ):
+		"""Removes all the entries (of the given `phase`, if specified)."""
+		for k in [_ for _ in self.entries if phase is None or _[0] == phase]:
+			del self.entries[k]
+		return self
+
+	def list( self, phase=None, transient=False ):
+		"""Returns the entries sorted by index, optionally limited to the
+		given `phase` and/or to `transient` errors."""
+		res = [_ for _ in self.entries.values() if (phase is None or _[1] == phase) and (not transient or self.isTransient(_[2]))]
+		return sorted(res)
+
+	def isTransient( self, code ):
+		return code in self.TRANSIENT
+
+	def attempts( self ):
+		"""Yields the attempt number for each of the `retries`, sleeping with an
+		exponential backoff before each one."""
+		for attempt in range(self.retries):
+			delay = self.backoff * (2 ** attempt)
+			logging.info("Errors: retry {0}/{1} in {2:0.1f}s".format(attempt + 1, self.retries, delay))
+			time.sleep(delay)
+			yield attempt
+
+	def save( self ):
+		"""Rewrites the error list with the current entries, removing the file
+		when there is no error left."""
+		if not self.entries:
+			if os.path.exists(self.path):
+				os.unlink(self.path)
+			return self
+		self._ensureDirectory()
+		with open(self.path + ".tmp", "wb") as f:
+			for entry in self.list():
+				f.write(self._line(entry))
+		os.replace(self.path + ".tmp", self.path)
+		return self
+
+	def _line( self, entry ):
+		return bytes(self.FIELD_SEPARATOR.join(str(_) for _ in entry) + self.LINE_SEPARATOR, "utf8", "surrogateescape")
+
+	def _ensureDirectory( self ):
+		d = os.path.dirname(self.path)
+		if d and not os.path.exists(d):
+			os.makedirs(d)
+
+	def __len__( self ):
+		return len(self.entries)
+
+# -----------------------------------------------------------------------------
+#
+# THROTTLE
+#
+# -----------------------------------------------------------------------------
+
+class Throttle(object):
+	"""Limits the impact of rawcopy on the filesystems by pacing the
+	transferred bytes per second and the metadata operations per second
+	using token buckets. The limits are read from an optional JSON control
+	file that is checked for changes every `INTERVAL` seconds, so that they
+	can be adjusted while rawcopy runs.
+
+	The control file holds `bytes` (per second), `ops` (per second) and
+	`latency` (in milliseconds) keys, where `0` means no limit. Limits given
+	explicitly (including `0`) override the ones from the control file, which
+	is then rewritten with the resulting limits.
+
+	When a `latency` target is given, the throttle adapts to
+	the observed per-operation latency: when it rises above the target, a
+	pause proportional to the operation's duration is inserted after each
+	operation, and it is progressively removed once the latency goes back
+	below the target.
+
+	The throttle is used as a context manager around a metadata operation,
+	and `transferred()` is called after each chunk of data is copied."""
+
+	INTERVAL = 1.0
+	ADJUST   = 0.25
+	CHUNK    = 1024 * 1024
+	SMOOTHING= 0.2
+	LIMITS   = ("bytes", "ops", "latency")
+
+	def __init__( self, path=None, bytes=None, ops=None, latency=None ):
+		self.path     = path
+		self.limits   = dict(bytes=0, ops=0, latency=0)
+		self.active   = False
+		self.latency  = 0.0
+		self.factor   = 1.0
+		self._tokens  = dict(bytes=0.0, ops=0.0)
+		self._updated = dict(bytes=0.0, ops=0.0)
+		self._version = None
+		self._checked = 0.0
+		self._adjusted= 0.0
+		self._started = 0.0
+		self._excluded= 0.0
+		self.load()
+		given = dict((k, v) for k, v in zip(self.LIMITS, (bytes, ops, latency)) if v is not None)
+		if given:
+			self.limits.update(given)
+			if self.path: self.save()
+		self._update()
+
+	def load( self ):
+		"""Loads the limits from the control file, if it exists."""
+		if not self.path or not os.path.exists(self.path): return self
+		try:
+			self._version = self.version()
+			with open(self.path, "r") as f:
+				limits = json.load(f)
+			for k in self.LIMITS:
+				self.limits[k] = float(limits.get(k) or 0)
+			logging.info("Throttle: using limits {0} from {1}".format(self.limits, utf8(self.path)))
+		except (OSError, ValueError, AttributeError) as e:
+			logging.error("Throttle: could not read control file {0}: {1}".format(utf8(self.path), e))
+		return self._update()
+
+	def save( self ):
+		"""Saves the current limits to the control file."""
+		d = os.path.dirname(self.path)
+		if d and not os.path.exists(d):
+			os.makedirs(d)
+		with open(self.path, "w") as f:
+			json.dump(self.limits, f)
+		self._version = self.version()
+		return self
+
+	def reload( self ):
+		"""Reloads the control file if it changed since it was last read."""
+		self._checked = time.time()
+		if not self.path: return self
+		try:
+			version = self.version()
+		except OSError:
+			return self
+		if version != self._version:
+			self.load()
+		return self
+
+	def version( self ):
+		"""Returns the `(mtime, size)` of the control file, the modification
+		time being in nanoseconds so that changes made within the same second
+		are detected."""
+		s = os.stat(self.path)
+		return (s.st_mtime_ns, s.st_size)
+
+	def _update( self ):
+		self.active = bool(self.limits["bytes"] or self.limits["ops"] or self.limits["latency"])
+		if not self.limits["latency"]:
+			self.factor = 1.0
+		return self
+
+	def ops( self, count=1 ):
+		"""Waits until `count` metadata operations can be done."""
+		if time.time() - self._checked > self.INTERVAL: self.reload()
+		if self.limits["ops"]: self._consume("ops", count)
+
+	def transferred( self, count, duration ):
+		"""Accounts for `count` bytes that were transferred in `duration`
+		seconds, waiting if the bandwidth limit is reached."""
+		if time.time() - self._checked > self.INTERVAL: self.reload()
+		self._excluded += duration
+		self.measure(duration)
+		if self.limits["bytes"]: self._consume("bytes", count)
+
+	def measure( self, duration ):
+		"""Records the latency of an operation, pausing when the adaptive mode
+		is enabled and the latency is above the target."""
+		target = self.limits["latency"] / 1000.0
+		if not target: return
+		self.latency = self.latency + self.SMOOTHING * (duration - self.latency) if self.latency else duration
+		# The factor is decreased multiplicatively and increased additively,
+		# at most every `ADJUST` seconds.
+		now = time.time()
+		if now - self._adjusted > self.ADJUST:
+			self._adjusted = now
+			if self.latency > target:
+				self.factor = max(0.01, self.factor * 0.75)
+			else:
+				self.factor = min(1.0, self.factor + 0.05)
+		if self.factor < 1.0:
+			self._sleep(duration * (1.0 / self.factor - 1.0))
+
+	def _consume( self, kind, count ):
+		"""Takes `count` tokens from the bucket of the given `kind`, sleeping
+		until they are available. Buckets hold at most one second worth of
+		tokens."""
+		rate    = self.limits[kind]
+		now     = time.time()
+		tokens  = min(rate, self._tokens[kind] + (now - self._updated[kind]) * rate)
+		self._updated[kind] = now
+		if tokens >= count:
+			self._tokens[kind] = tokens - count
+		else:
+			self._tokens[kind] = 0.0
+			self._sleep((count - tokens) / rate)
+			self._updated[kind] = time.time()
+
+	def _sleep( self, delay ):
+		self._excluded += delay
+		time.sleep(delay)
+
+	def __enter__( self ):
+		self.ops(1)
+		if self.limits["latency"]:
+			self._started  = time.time()
+			self._excluded = 0.0
+		return self
+
+	def __exit__( self, type, value, traceback ):
+		if self.limits["latency"] and self._started:
+			self.measure(time.time() - self._started - self._excluded)
+			self._started = 0.0
+		return False
+
 # -----------------------------------------------------------------------------
 #
 # FILTER
@@ -294,11 +683,16 @@ class Catalogue(object):
 	# SEE: https://en.wikipedia.org/wiki/Delimiter
 	FIELD_SEPARATOR = chr(31)
 	LINE_SEPARATOR  = "\n"
+	STATE_SUFFIX    = ".state"
+	INDEX_SUFFIX    = ".idx"
+	CHECKPOINT      = 30.0
 
-
-	def __init__( self, paths=(), base=None, filter=None ):
+	def __init__( self, paths=(), base=None, filter=None, errors=None, throttle=None ):
 		"""Creates a new catalogue with the given `base` path, given
-		list of `paths` and optional `filter`."""
+		list of `paths` and optional `filter`. When an `errors` list is
+		given, paths that cannot be read are recorded there instead of
+		halting the walk. The optional `throttle` paces the walk's
+		filesystem operations."""
 		base        = base or os.path.commonprefix(sources)
 		if not os.path.exists(base) or not os.path.isdir(base): base = os.path.dirname(base)
 		self.base   = base
@@ -306,13 +700,30 @@ class Catalogue(object):
 		for _ in self.paths:
 			assert _.startswith(base)
 		self.filter = filter
-
-	def walk( self ):
-		"""Walks all the catalogue's `paths` and yields triples `(index, type, path)`."""
-		counter = 0
-		yield (counter, TYPE_BASE, self.base)
-		for p in self.paths:
-			mode = os.lstat(p)[stat.ST_MODE]
+		self.errors = errors
+		self.throttle = throttle or Throttle()
+		self._position = None
+
+	def walk( self, state=None ):
+		"""Walks all the catalogue's `paths` and yields triples `(index, type, path)`.
+		When a `state` (as returned by `state()`) is given, the walk resumes
+		from it instead of starting over."""
+		counter = state["counter"] if state else 0
+		failed  = list(state["failed"]) if state else []
+		self._position = None
+		if not state:
+			yield (counter, TYPE_BASE, self.base)
+		for k, p in enumerate(self.paths):
+			if state and k < state["source"]:
+				continue
+			elif state and k == state["source"] and state["stack"] is not None:
+				counter = yield from self._walkTree(list(state["stack"]), counter, failed, k)
+				continue
+			try:
+				mode = os.lstat(p)[stat.ST_MODE]
+			except OSError as e:
+				self.fail(counter, e, p)
+				continue
 			if stat.S_ISCHR(mode):
 				logging.info("Catalogue: Skipping special device file: {0}".format(utf8(p)))
 			elif stat.S_ISBLK(mode):
@@ -322,55 +733,279 @@ class Catalogue(object):
 			elif stat.S_ISSOCK(mode):
 				logging.info("Catalogue: Skipping socket file: {0}".format(utf8(p)))
 			elif os.path.isfile(p) and self.match(p, TYPE_FILE):
+				self._position = (k, None, None, counter, failed)
 				yield (counter, TYPE_ROOT, os.path.dirname(p))
 				counter += 1
 				yield (counter, TYPE_FILE, os.path.basename(p))
 			elif os.path.islink(p) and self.match(p, TYPE_SYMLINK):
+				self._position = (k, None, None, counter, failed)
 				yield (counter, TYPE_ROOT, os.path.dirname(p))
 				counter += 1
 				yield (counter, TYPE_SYMLINK, os.path.basename(p))
 			elif self.match(p, TYPE_DIR):
-				for root, dirs, files in os.walk(p, topdown=True):
-					logging.info("Catalogue:\t#{3:010d}\t{0:04d}f+{1:04d}d\t{2}".format(len(files), len(dirs), utf8(root), counter))
-					yield (counter, TYPE_ROOT, root)
-					for name in files:
-						path = os.path.join(root, name)
-						type = TYPE_SYMLINK if os.path.islink(path) else TYPE_FILE
-						if self.match(path, type):
-							yield (counter, type, name)
-							counter += 1
-					for name in dirs:
-						path = os.path.join(root, name)
-						if self.match(path, TYPE_DIR):
-							yield (counter, TYPE_DIR, name)
-							counter += 1
+				counter = yield from self._walkTree([p], counter, failed, k)
 			else:
 				logging.info("Catalogue: Filtered out path: {0}".format(utf8(p)))
+		# Directories that could not be listed because of a transient error
+		# are retried at the end, their contents being appended as new roots.
+		self._position = None
+		if failed and self.errors is not None:
+			for attempt in self.errors.attempts():
+				retry, failed = failed, []
+				for p in retry:
+					self.errors.remove(Errors.PHASE_CATALOGUE, p)
+					counter = yield from self._walkTree([p], counter, failed)
+				if not failed: break
+
+	def _walkTree( self, stack, counter, failed, source=None ):
+		"""Walks the directory trees in the given `stack` in the same order
+		as a top-down `os.walk`, yielding their roots and entries starting at
+		`counter`, and returns the next counter value. When `source` (the
+		index of the path being walked) is given, the position is updated
+		before each root so that the walk can be resumed from it."""
+		onerror = (lambda e:self.fail(counter, e, e.filename, failed)) if self.errors is not None else None
+		while stack:
+			root    = stack.pop()
+			# Listing the directory counts as one operation
+			self.throttle.ops(1)
+			listing = self._list(root, onerror)
+			if listing is None: continue
+			dirs, files = listing
+			if source is not None:
+				self._position = (source, stack, root, counter, failed)
+			logging.info("Catalogue:\t#{3:010d}\t{0:04d}f+{1:04d}d\t{2}".format(len(files), len(dirs), utf8(root), counter))
+			yield (counter, TYPE_ROOT, root)
+			for name in files:
+				path = os.path.join(root, name)
+				with self.throttle:
+					type = TYPE_SYMLINK if os.path.islink(path) else TYPE_FILE
+				if self.match(path, type):
+					yield (counter, type, name)
+					counter += 1
+			for name in dirs:
+				path = os.path.join(root, name)
+				if self.match(path, TYPE_DIR):
+					yield (counter, TYPE_DIR, name)
+					counter += 1
+			# Like `os.walk`, we don't follow symlinks to directories
+			for name in reversed(dirs):
+				path = os.path.join(root, name)
+				if not os.path.islink(path):
+					stack.append(path)
+		return counter
+
+	def _list( self, path, onerror=None ):
+		"""Lists the directory at the given `path` as a `(dirs, files)` couple
+		of names, like `os.walk` does, returning `None` if it cannot be
+		listed."""
+		dirs, files = [], []
+		try:
+			with os.scandir(path) as entries:
+				for entry in entries:
+					try:
+						is_dir = entry.is_dir()
+					except OSError:
+						is_dir = False
+					(dirs if is_dir else files).append(entry.name)
+		except OSError as e:
+			if onerror: onerror(e)
+			return None
+		return dirs, files
+
+	def state( self ):
+		"""Returns the state of the walk right before the last yielded root,
+		from which `walk()` can be resumed, or `None` if the walk cannot be
+		resumed from there."""
+		if not self._position: return None
+		source, stack, root, counter, failed = self._position
+		return dict(
+			source  = source,
+			stack   = None if stack is None else stack + [root],
+			counter = counter,
+			failed  = list(failed),
+		)
+
+	def fail( self, index, error, path, failed=None ):
+		"""Records the failure to read the given `path`, adding it to the
+		`failed` list when it is worth retrying. This re-raises the error
+		when the catalogue has no error list."""
+		if self.errors is None: raise error
+		self.errors.add(index, Errors.PHASE_CATALOGUE, error, TYPE_DIR, path)
+		if failed is not None and self.errors.isTransient(error.errno):
+			failed.append(path)
 
 	def match( self, path, type ):
 		"""Tells if the given path/type matches the filter, if any is available."""
 		return self.filter.match(path, type) if self.filter else True
 
-	def write( self, output ):
+	def write( self, output, state=None, checkpoint=None, index=None ):
 		"""Writes the catalogue to the given output, this triggers a walk
-		of the catalogue."""
-		for i, t, p in self.walk():
+		of the catalogue, resumed from the given `state` if any. When a
+		`checkpoint` path is given, the state of the walk is saved there
+		every `CHECKPOINT` seconds, right after a directory was completely
+		written. When an `index` output is given, the offset and item range
+		of each root are written to it (see `segments()`)."""
+		last    = time.time()
+		segment = None
+		end     = 0
+		for i, t, p in self.walk(state):
 			assert t in TYPES
+			if t == TYPE_ROOT:
+				# The new root ends the previous one's segment
+				if index and segment:
+					self._writeSegment(index, segment, i)
+					segment = None
+				if checkpoint and time.time() - last > self.CHECKPOINT:
+					self.checkpoint(output, checkpoint, index)
+					last = time.time()
 			try:
+				offset = output.tell()
 				line = bytes("{0}{3}{1}{3}{2}{4}".format(i,t,p, self.FIELD_SEPARATOR, self.LINE_SEPARATOR), "utf8")
 				output.write(line)
+				if t == TYPE_ROOT: segment = (offset, i, p)
 			except UnicodeEncodeError as e:
 				logging.error("Catalogue: exception occured {0}".format(e))
+			end = i if t in (TYPE_BASE, TYPE_ROOT) else i + 1
+		if index and segment:
+			self._writeSegment(index, segment, end)
+
+	def _writeSegment( self, index, segment, end ):
+		offset, start, root = segment
+		index.write(bytes("{0}{4}{1}{4}{2}{4}{3}{5}".format(offset, start, end, root, self.FIELD_SEPARATOR, self.LINE_SEPARATOR), "utf8"))
+
+	@classmethod
+	def segments( cls, path, prefixes, parents=() ):
+		"""Returns the `(offset, start, end, root)` segments of the catalogue
+		at the given `path` whose root is within one of the given `prefixes`
+		(or is one of the given `parents`), `offset` being the position of
+		the root's line in the catalogue and `start`-`end` (exclusive) the
+		range of the root's item indexes. This returns `None` when the
+		catalogue has no up-to-date index."""
+		index = path + cls.INDEX_SUFFIX
+		if not os.path.exists(index) or os.stat(index)[stat.ST_MTIME] < os.stat(path)[stat.ST_MTIME]:
+			return None
+		res = []
+		with open(index, "r", encoding="utf8") as f:
+			for line in f:
+				fields = line[:-1].split(cls.FIELD_SEPARATOR, 3)
+				if len(fields) != 4:
+					logging.error("Catalogue: malformed index line: {0}".format(repr(line)))
+					return None
+				if cls.isWithin(fields[3], prefixes) or fields[3] in parents:
+					res.append((int(fields[0]), int(fields[1]), int(fields[2]), fields[3]))
+		return res
+
+	@classmethod
+	def entries( cls, path, root ):
+		"""Yields the `(index, type, name)` entries of the given `root` in the
+		catalogue at the given `path`, using the catalogue's index when
+		available."""
+		segments = cls.segments(path, [root])
+		offsets  = [0] if segments is None else [_[0] for _ in segments if _[3] == root]
+		with open(path, "r") as f:
+			for offset in offsets:
+				f.seek(offset)
+				current = None
+				for line in iter(f.readline, ""):
+					fields = line[:-1].split(cls.FIELD_SEPARATOR, 2)
+					if len(fields) != 3:
+						continue
+					elif fields[1] in (TYPE_BASE, TYPE_ROOT):
+						# With the index, we stop at the end of the segment
+						if segments is not None and current is not None: break
+						current = fields[2]
+					elif current == root:
+						yield (int(fields[0]), fields[1], fields[2])
+
+	@staticmethod
+	def normalize( base, prefixes ):
+		"""Returns the given `prefixes` as normalized absolute paths, relative
+		paths being relative to the given `base`."""
+		return [os.path.normpath(os.path.join(base, _)) for _ in prefixes]
+
+	@staticmethod
+	def isWithin( path, prefixes ):
+		"""Tells if the given path is one of the given `prefixes` or is
+		within one of them."""
+		for prefix in prefixes:
+			if path == prefix or path.startswith(prefix + os.sep):
+				return True
+		return False
+
+	def checkpoint( self, output, path, index=None ):
+		"""Saves the current state of the walk to the given `path`, along
+		with the offset of the given `output` (and `index`) at which writing
+		resumes. The outputs are synced first, so that everything before the
+		offsets is guaranteed to be written."""
+		state = self.state()
+		if state is None: return None
+		for f in (output, index):
+			if f:
+				f.flush()
+				os.fsync(f.fileno())
+		state.update(base=self.base, paths=self.paths, offset=output.tell(), indexOffset=index.tell() if index else None)
+		with open(path + ".tmp", "w") as f:
+			json.dump(state, f)
+		os.replace(path + ".tmp", path)
+		logging.info("Catalogue: checkpoint at #{0:010d}".format(state["counter"]))
+		return state
+
+	def restore( self, path, output ):
+		"""Loads the state saved by `checkpoint()` at the given `path`,
+		returning `None` if it does not exist or does not match this catalogue
+		or its `output` file (and its index)."""
+		if not os.path.exists(path) or not os.path.exists(output): return None
+		try:
+			with open(path, "r") as f:
+				state = json.load(f)
+		except (OSError, ValueError) as e:
+			logging.error("Catalogue: could not read checkpoint {0}: {1}".format(utf8(path), e))
+			return None
+		if state.get("base") != self.base or state.get("paths") != self.paths:
+			logging.warn("Catalogue: checkpoint {0} is for different paths, ignoring it".format(utf8(path)))
+			return None
+		if os.path.getsize(output) < state["offset"]:
+			logging.warn("Catalogue: catalogue {0} is shorter than its checkpoint, ignoring it".format(utf8(output)))
+			return None
+		index = output + self.INDEX_SUFFIX
+		if state.get("indexOffset") is None or not os.path.exists(index) or os.path.getsize(index) < state["indexOffset"]:
+			logging.warn("Catalogue: catalogue index {0} does not match its checkpoint, ignoring it".format(utf8(index)))
+			return None
+		return state
 
 	def save( self, path ):
-		"""Saves the catalogue to the given `path`. This will in turn call
-		`write()`."""
+		"""Saves the catalogue to the given `path`, along with its index (at
+		`path` + `INDEX_SUFFIX`). This will in turn call `write()`. If a
+		previous save was interrupted, the catalogue is resumed from its last
+		checkpoint (stored at `path` + `STATE_SUFFIX`), so that the result is
+		the same as an uninterrupted save."""
 		d = os.path.dirname(path)
 		if not os.path.exists(d):
 			logging.info("Catalogue: creating catalogue directory {0}".format(utf8(d)))
 			os.makedirs(d)
-		with open(path, "wb") as f:
-			self.write(f)
+		checkpoint = path + self.STATE_SUFFIX
+		state      = self.restore(checkpoint, path)
+		if state:
+			logging.info("Catalogue: resuming catalogue from #{0:010d}".format(state["counter"]))
+			f = open(path, "r+b")
+			f.seek(state["offset"])
+			f.truncate()
+			i = open(path + self.INDEX_SUFFIX, "r+b")
+			i.seek(state["indexOffset"])
+			i.truncate()
+		else:
+			if self.errors is not None:
+				self.errors.clear(Errors.PHASE_CATALOGUE)
+			f = open(path, "wb")
+			i = open(path + self.INDEX_SUFFIX, "wb")
+		# The catalogue is closed before its index, so that the index is
+		# never older than the catalogue (see `segments()`).
+		with i, f:
+			self.write(f, state, checkpoint, i)
+		if os.path.exists(checkpoint):
+			os.unlink(checkpoint)
+		if self.errors is not None:
+			self.errors.save()
 
 # -----------------------------------------------------------------------------
 #
@@ -378,17 +1013,93 @@ class Catalogue(object):
 #
 # -----------------------------------------------------------------------------
 
+class DestinationIndex(object):
+	"""An in-memory index of the types of the entries of the output
+	directories. Each directory is listed at most once with `scandir` (as
+	long as it stays in the `LIMIT` most recently used ones), so that
+	checking whether an entry exists does not require a `stat` call per
+	entry."""
+
+	LIMIT = 256
+
+	def __init__( self, limit=LIMIT ):
+		self.limit       = limit
+		self.directories = {}
+
+	def list( self, path ):
+		"""Returns the `{name:type}` listing of the directory at the given
+		`path`, or `None` if it does not exist."""
+		if path in self.directories:
+			# We move the listing to the end, as the most recently used
+			listing = self.directories[path] = self.directories.pop(path)
+			return listing
+		listing = {}
+		try:
+			with os.scandir(path) as entries:
+				for entry in entries:
+					if entry.is_symlink():
+						listing[entry.name] = TYPE_SYMLINK
+					elif entry.is_dir(follow_symlinks=False):
+						listing[entry.name] = TYPE_DIR
+					else:
+						listing[entry.name] = TYPE_FILE
+		except (FileNotFoundError, NotADirectoryError):
+			listing = None
+		return self._set(path, listing)
+
+	def get( self, path ):
+		"""Returns the type of the entry at the given `path`, or `None` if
+		it does not exist."""
+		listing = self.list(os.path.dirname(path))
+		return listing.get(os.path.basename(path)) if listing else None
+
+	def add( self, path, type ):
+		"""Registers the newly created entry of the given `type` at the given
+		`path`."""
+		parent = self.directories.get(os.path.dirname(path))
+		if parent is not None:
+			parent[os.path.basename(path)] = type
+		if type == TYPE_DIR:
+			# A new directory is empty
+			self._set(path, {})
+		return self
+
+	def clear( self ):
+		self.directories = {}
+		return self
+
+	def _set( self, path, listing ):
+		self.directories.pop(path, None)
+		self.directories[path] = listing
+		while len(self.directories) > self.limit:
+			del self.directories[next(iter(self.directories))]
+		return listing
+
 class Copy(object):
 	"""A collection of tools to do the actual copy from a source directory to
 	a destination."""
 
-	def __init__( self, output, filter=None ):
+	PHASES = {
+		TYPE_DIR     : Errors.PHASE_DIR,
+		TYPE_FILE    : Errors.PHASE_FILE,
+		TYPE_SYMLINK : Errors.PHASE_LINK,
+	}
+
+	def __init__( self, output, filter=None, errors=None, throttle=None, indexed=False ):
 		self.db     = None
 		self.last   = -1
+		self.index  = -1
 		self.output = output
 		self.base   = None
 		self.root   = None
 		self.filter = filter
+		self.errors = errors
+		self.throttle = throttle or Throttle()
+		self.destinations = DestinationIndex() if indexed else None
+		self.prefixes = None
+		self.parents  = set()
+		self.test   = False
+		self._catalogue = None
 		self._indexPath = os.path.join(self.output, "__rawcopy__/index.json")
 		if not os.path.exists(output):
 			logging.info("Creating output directory {0}".format(output))
@@ -408,19 +1119,51 @@ class Copy(object):
 			self.db = None
 		return self
 
-	def fromCatalogue( self, path, range=None, test=False, callback=None ):
+	def _start( self, base ):
+		"""Sets the catalogue's base and opens rawcopy's DB files."""
+		self.base = base
+		assert os.path.exists(base), "Base directory does not exists: {0}".format(utf8(base))
+		# Once we have the base, we can create rawcopy's DB files
+		rd = os.path.join(self.output, "__rawcopy__")
+		if not os.path.exists(rd):
+			logging.info("Creating rawcopy database directory {0}".format(utf8(rd)))
+			os.makedirs(rd)
+		self._open(os.path.join(rd, "copy.db"))
+		return self
+
+	def _destination( self, source ):
+		"""Returns the `(suffix, destination)` couple for the given absolute
+		`source` path."""
+		suffix = source[len(self.base):]
+		if suffix and suffix[0] == "/": suffix = suffix[1:]
+		return suffix, os.path.join(self.output, suffix)
+
+	def fromCatalogue( self, path, range=None, test=False, callback=None, resume=True, prefixes=None ):
 		"""Reads the given catalogue and copies directories, symlinks and files
 		listed in the catalogue. Note that this expects the catalogue to
-		be in traversal order."""
+		be in traversal order. When `resume` is `False` (for partial
+		catalogues, such as the batches of the watch mode), the resume index
+		is neither read nor updated and failures are not retried at the
+		end. When `prefixes` are given, only the entries within these paths
+		(absolute or relative to the base) are processed, using the
+		catalogue's index to jump directly to their roots when available."""
 		logging.info("Opening catalogue: {0}".format(path))
 		# The base is the common prefix/ancestor of all the paths in the
 		# catalogue. The root changes but will always start with the base.
 		base      = None
 		root      = None
+		selected  = True
+		partial   = False
+		failed    = False
+		matched   = False
 		self.test = test
+		self._catalogue = path
+		self.select(None)
+		# The resume index is only relevant for complete runs
+		resume_index = resume and not prefixes
 		# When no range is specified, we look for the index path
 		# and load it.
-		if range is None and os.path.exists(self._indexPath) and os.stat(path)[stat.ST_MTIME] <= os.stat(self._indexPath)[stat.ST_MTIME]:
+		if range is None and resume_index and os.path.exists(self._indexPath) and os.stat(path)[stat.ST_MTIME] <= os.stat(self._indexPath)[stat.ST_MTIME]:
 			with open(self._indexPath, "r") as f:
 				r = f.read()
 			try:
@@ -429,25 +1172,19 @@ class Copy(object):
 			except ValueError as e:
 				pass
 		with open(path, "r") as f:
-			for line in f:
+			for line in self._lines(f, path, prefixes, range):
 				j_t_p     = line.split(Catalogue.FIELD_SEPARATOR, 2)
 				if len(j_t_p) != 3:
 					logging.error("Malformed line, expecting at least 3 colon-separated values: {0}".format(repr(line)))
 					continue
 				j, t, p   =  j_t_p
 				p = p[:-1]
-				i         = int(j) ; self.last = i
+				i         = int(j) ; self.last = i ; self.index = i
 				if t == TYPE_BASE:
 					# The first line of the catalogue is expected to be the base
 					# it is also expected to be absolute.
-					self.base = base = p
-					assert os.path.exists(p), "Base directory does not exists: {0}".format(utf8(p))
-					# Once we have the base, we can create rawcopy's DB files
-					rd = os.path.join(self.output, "__rawcopy__")
-					if not os.path.exists(rd):
-						logging.info("Creating rawcopy database directory {0}".format(utf8(rd)))
-						os.makedirs(rd)
-					self._open(os.path.join(rd, "copy.db"))
+					base = p
+					self._start(base)
 				elif t == TYPE_ROOT:
 					# If we found a root, we ensure that it is prefixed with the
 					# base
@@ -456,30 +1193,26 @@ class Copy(object):
 					# Now we extract the suffix, which is the root minus the base
 					# and no leading /
 					self.root = root = p
-					source    = p
-					suffix    = p[len(self.base):]
-					if suffix and suffix[0] == "/": suffix = suffix[1:]
-					destination = os.path.join(os.path.join(self.output, suffix))
-					if not (os.path.exists(destination) and not os.path.islink(destination)):
-						pd = os.path.dirname(destination)
-						logging.info("Creating root: {0}:{1}".format(i, utf8(p)))
-						# We make sure the source exists
-						if not os.path.exists(source) and not os.path.islink(source):
-							logging.info("Root does not exists: {0}:{1}".format(i, utf8(p)))
-						# TODO: How do we handle filters at this stage?
-						# We make sure the parent destination exists (it should be the case)
-						if not os.path.exists(pd):
-							# We copy the original parent directory
-							self.copydir(p, pd, suffix)
-						if os.path.isdir(source):
-							self.copydir(p, destination, suffix)
-						elif os.path.islink(source):
-							self.copylink(p, destination, suffix)
-						elif os.path.isfile(source):
-							self.copyfile(p, destination, suffix)
-						else:
-							logging.error("Unsupported root (not a dir/link/file): {0}:{1}".format(i, utf8(p)))
-				else:
+					# A root is selected when within the selected paths, and
+					# partially selected when it holds selected files or
+					# symlinks, in which case its entries are filtered.
+					selected  = self.selects(os.path.normpath(p))
+					partial   = not selected and os.path.normpath(p) in self.parents
+					if not (selected or partial): continue
+					matched   = matched or selected
+					suffix, destination = self._destination(p)
+					failed    = False
+					try:
+						with self.throttle:
+							if prefixes: self.copyparents(p, destination)
+							self.copyroot(i, p, suffix, destination)
+					except OSError as e:
+						self.fail(i, Errors.PHASE_ROOT, e, t, p)
+						# The root's entries can't be copied without it, they
+						# will be copied when the root is retried.
+						logging.error("Skipping the entries of root: {0}:{1}".format(i, utf8(p)))
+						failed = True
+				elif (selected or partial) and not failed:
 					# We skip the indexes that are not within the range, if given
 					if range:
 						if i < range[0]: continue
@@ -492,51 +1225,293 @@ class Copy(object):
 					assert root and self.output
 					# We prepare the source, suffix and destination
 					source = os.path.join(root, p)
+					if partial:
+						if not self.selects(os.path.normpath(source)): continue
+						matched = True
 					assert source.startswith(base), "os.path.join(root={0}, path={1}) expected to start with base={2}".format(repr(root), repr(p), repr(base))
-					suffix = source[len(base):]
-					if suffix[0] == "/": suffix = suffix[1:]
-					destination = os.path.join(os.path.join(self.output, suffix))
-					assert suffix, "Empty suffix: source={0}, path={1}, destination={2}".format(utf8(source), utf(p), utf8(destination))
+					suffix, destination = self._destination(source)
+					assert suffix, "Empty suffix: source={0}, path={1}, destination={2}".format(utf8(source), utf8(p), utf8(destination))
 					# We now proceed with the actual copy
-					if not (os.path.exists(source) or os.path.islink(source)):
-						logging.error("Source path not available: {0}:{1}".format(i,utf8(source)))
-					elif not (os.path.exists(destination) or os.path.islink(destination)):
-						logging.info("Copying path [{2}] {0}:{1}".format(i,utf8(p),t))
-						if t == TYPE_DIR or os.path.isdir(source):
-							if t != TYPE_DIR: logging.warn("Source detected as directory, but typed as {0} -- {1}:{2}".format(t, i, utf8(p)))
-							self.copydir(source, destination, p)
-						elif t == TYPE_SYMLINK:
-							self.copylink(source, destination, p)
-						elif t == TYPE_FILE:
-							self.copyfile(source, destination, p)
-						else:
-							logging.error("Copy: line {0} unsupported type {1}".format(i, t, p))
-					elif not self.test:
-						# We only fo there if we're not in test mode
-						if t == TYPE_DIR:
-							logging.info("Skipping already copied directory: {0}:{1}".format(i, utf8(destination)))
-						elif t == TYPE_SYMLINK:
-							logging.info("Skipping already copied link: {0}:{1}".format(i, utf8(destination)))
-						elif t == TYPE_FILE:
-							logging.info("Skipping already copied file: {0}:{1}".format(i, utf8(destination)))
-						# TODO: We should repair a damaged DB and make sure the inode is copied
-						self.ensureInodePath(source, suffix)
+					try:
+						with self.throttle:
+							if self.destinations is None and not (os.path.exists(source) or os.path.islink(source)):
+								logging.error("Source path not available: {0}:{1}".format(i,utf8(source)))
+							elif not self.lexists(destination):
+								self.copyindexed(i, t, p, source, destination)
+							elif not self.test:
+								# We only fo there if we're not in test mode
+								if t == TYPE_DIR:
+									logging.info("Skipping already copied directory: {0}:{1}".format(i, utf8(destination)))
+								elif t == TYPE_SYMLINK:
+									logging.info("Skipping already copied link: {0}:{1}".format(i, utf8(destination)))
+								elif t == TYPE_FILE:
+									logging.info("Skipping already copied file: {0}:{1}".format(i, utf8(destination)))
+								# TODO: We should repair a damaged DB and make sure the inode is copied
+								# NOTE: Only files are hard linked, so when using the
+								# destination index we don't stat the other types.
+								if self.destinations is None:
+									self.ensureInodePath(source, suffix)
+								elif t == TYPE_FILE:
+									self.ensureIndexedInodePath(i, source, suffix)
+					except OSError as e:
+						self.fail(i, self.PHASES.get(t, Errors.PHASE_FILE), e, t, source)
 					# We call the callback
 					if callback:
 						callback(i, t, p, source, destination)
 				# We sync the database every 1000 item
 				if j.endswith("000") and (not range or i>=range[0]):
 					logging.info("{0} items processed, syncing db".format(i))
-					self._sync(j)
+					self._sync(j if resume_index else None)
+		if prefixes and not matched:
+			logging.warn("No catalogue entry within the selected paths: {0}".format(", ".join(utf8(_) for _ in self.prefixes or prefixes)))
+		# Transient failures are retried once the whole catalogue was
+		# processed.
+		if self.errors is not None and not self.test:
+			if resume: self.retry()
+			self.errors.save()
 		# We don't forget to close the DB
 		self._close()
 
+	def _lines( self, f, path, prefixes=None, range=None ):
+		"""Yields the lines of the given catalogue file `f` (read from `path`).
+		When `prefixes` are given, they are selected (see `select()`) and
+		only the base and the segments of the roots within them (or holding
+		them) are yielded, provided the catalogue has an index."""
+		line = f.readline()
+		if prefixes:
+			self.select(line[:-1].split(Catalogue.FIELD_SEPARATOR, 2)[-1], prefixes)
+		yield line
+		segments = Catalogue.segments(path, self.prefixes, self.parents) if prefixes else None
+		if segments is None:
+			if prefixes: logging.warn("Catalogue has no up-to-date index, scanning it for the selected paths")
+			line = f.readline()
+			while line:
+				yield line
+				line = f.readline()
+			return
+		for offset, start, end, root in segments:
+			if range and end <= range[0]: continue
+			f.seek(offset)
+			# We yield the root's line and then the lines until the next root
+			line = f.readline()
+			while line:
+				yield line
+				line = f.readline()
+				fields = line.split(Catalogue.FIELD_SEPARATOR, 2)
+				if len(fields) == 3 and fields[1] in (TYPE_ROOT, TYPE_BASE): break
+
+	def fromErrors( self, path, prefixes=None ):
+		"""Processes only the entries of the error list that failed in a
+		previous run, using the base of the catalogue at the given `path`,
+		limited to the given `prefixes` if any. Failures of the catalogue
+		phase are left as-is, as they require the catalogue to be
+		regenerated."""
+		assert self.errors is not None, "An error list is required"
+		with open(path, "r") as f:
+			j_t_p = f.readline().split(Catalogue.FIELD_SEPARATOR, 2)
+		assert len(j_t_p) == 3 and j_t_p[1] == TYPE_BASE, "Catalogue is expected to start with a base: {0}".format(utf8(path))
+		self._start(j_t_p[2][:-1])
+		self._catalogue = path
+		self.select(self.base, prefixes)
+		pending = self._pending(self.errors.list())
+		logging.info("Processing {0} failed entries from {1}".format(len(pending), utf8(self.errors.path)))
+		for entry in pending:
+			self.retryEntry(*entry)
+		self.retry()
+		self.errors.save()
+		self._close()
+		return len(self.errors)
+
+	def retry( self ):
+		"""Retries the entries that failed with a transient error, with an
+		exponential backoff between each attempt."""
+		pending = self._pending(self.errors.list(transient=True))
+		if not pending: return True
+		logging.info("Retrying {0} entries that failed with a transient error".format(len(pending)))
+		for attempt in self.errors.attempts():
+			pending = [_ for _ in pending if not self.retryEntry(*_)]
+			if not pending: break
+		return not pending
+
+	def _pending( self, entries ):
+		"""Returns the given error list entries that can be retried and are
+		within the selected paths."""
+		return [_ for _ in entries if _[1] != Errors.PHASE_CATALOGUE and (self.selects(_[4]) or (_[1] == Errors.PHASE_ROOT and _[4] in self.parents))]
+
+	def select( self, base, prefixes=None ):
+		"""Limits the processed entries to the given `prefixes` (absolute or
+		relative to the given `base`), or to none when `prefixes` is empty.
+		The parents of the prefixes are kept as `parents`, as the roots
+		holding the selected files."""
+		self.prefixes = Catalogue.normalize(base, prefixes) if prefixes else None
+		self.parents  = set(os.path.dirname(_) for _ in self.prefixes or ())
+		if self.prefixes:
+			logging.info("Only processing the paths within: {0}".format(", ".join(utf8(_) for _ in self.prefixes)))
+		return self
+
+	def selects( self, path ):
+		"""Tells if the given normalized source path is within the selected
+		paths, if any."""
+		return self.prefixes is None or Catalogue.isWithin(path, self.prefixes)
+
+	def retryEntry( self, index, phase, code, type, source ):
+		"""Processes again the given error list entry, returning `True` when
+		it succeeded or failed with a non-transient error."""
+		suffix, destination = self._destination(source)
+		self.index = index
+		self.errors.remove(phase, source)
+		try:
+			with self.throttle:
+				if phase == Errors.PHASE_ROOT:
+					self.copyroot(index, source, suffix, destination)
+				elif phase == Errors.PHASE_ATTR:
+					self._copyattr(source, destination)
+				elif not (os.path.exists(destination) or os.path.islink(destination)):
+					self.copyentry(index, type, os.path.basename(source), source, destination)
+			# The root's entries are throttled one by one
+			if phase == Errors.PHASE_ROOT:
+				self.copyrootentries(source)
+			return True
+		except OSError as e:
+			entry = self.errors.add(index, phase, e, type, source)
+			return not self.errors.isTransient(entry[2])
+
+	def copyrootentries( self, root ):
+		"""Copies the entries of the given `root`, as listed in the catalogue,
+		that are not in the output yet. This is used once a root that had
+		failed could be copied."""
+		if not self._catalogue: return
+		for i, t, p in Catalogue.entries(self._catalogue, root):
+			if not self.match(p, t): continue
+			source = os.path.join(root, p)
+			if not (self.selects(root) or self.selects(os.path.normpath(source))): continue
+			suffix, destination = self._destination(source)
+			self.index = i
+			try:
+				with self.throttle:
+					if not (os.path.exists(destination) or os.path.islink(destination)):
+						self.copyentry(i, t, p, source, destination)
+			except OSError as e:
+				self.fail(i, self.PHASES.get(t, Errors.PHASE_FILE), e, t, source)
+
+	def fail( self, index, phase, error, type, path ):
+		"""Records the failure of the given `phase` for the given entry in the
+		error list, or re-raises the error if there is no error list."""
+		if self.errors is None: raise error
+		self.errors.add(index, phase, error, type, path)
+
+	def copyparents( self, path, destination ):
+		"""Creates the missing parent directories of the given `destination`,
+		copying the attributes of the parent directories of the source
+		`path`."""
+		parents = []
+		p, d    = os.path.dirname(path), os.path.dirname(destination)
+		while len(d) > len(self.output.rstrip(os.sep)) and not os.path.exists(d):
+			parents.insert(0, (p, d))
+			p, d = os.path.dirname(p), os.path.dirname(d)
+		for p, d in parents:
+			self.copydir(p, d, p[len(self.base):])
+
+	def copyroot( self, index, path, suffix, destination ):
+		"""Ensures that the given root `path` exists at the given
+		`destination`."""
+		if self.destinations is not None:
+			return self._copyIndexedRoot(index, path, suffix, destination)
+		if not (os.path.exists(destination) and not os.path.islink(destination)):
+			source = path
+			pd     = os.path.dirname(destination)
+			logging.info("Creating root: {0}:{1}".format(index, utf8(path)))
+			# We make sure the source exists
+			if not os.path.exists(source) and not os.path.islink(source):
+				logging.info("Root does not exists: {0}:{1}".format(index, utf8(path)))
+			# TODO: How do we handle filters at this stage?
+			# We make sure the parent destination exists (it should be the case)
+			if not os.path.exists(pd):
+				# We copy the original parent directory
+				self.copydir(os.path.dirname(path), pd, suffix)
+			if os.path.isdir(source):
+				self.copydir(path, destination, suffix)
+			elif os.path.islink(source):
+				self.copylink(path, destination, suffix)
+			elif os.path.isfile(source):
+				self.copyfile(path, destination, suffix)
+			else:
+				logging.error("Unsupported root (not a dir/link/file): {0}:{1}".format(index, utf8(path)))
+
+	def _copyIndexedRoot( self, index, path, suffix, destination ):
+		"""Like `copyroot`, but uses the destination index. Listing the root's
+		destination tells if it exists and indexes its contents at the same
+		time. The source is only checked when the root has to be created,
+		as catalogue roots are always directories."""
+		if self.destinations.list(destination) is None:
+			pd = os.path.dirname(destination)
+			logging.info("Creating root: {0}:{1}".format(index, utf8(path)))
+			if not os.path.isdir(path):
+				logging.error("Root does not exists: {0}:{1}".format(index, utf8(path)))
+				return None
+			if self.destinations.list(pd) is None:
+				self.copydir(os.path.dirname(path), pd, suffix)
+				if not self.test: self.destinations.add(pd, TYPE_DIR)
+			self.copydir(path, destination, suffix)
+			if not self.test: self.destinations.add(destination, TYPE_DIR)
+
+	def copyindexed( self, index, type, path, source, destination ):
+		"""Copies the given catalogue entry, updating the destination index
+		if any. As the source existence is not checked when using the
+		destination index, vanished sources are only detected here."""
+		if self.destinations is None:
+			return self.copyentry(index, type, path, source, destination)
+		# Directories would be created before their attributes fail to be
+		# copied, so their source is checked first.
+		if type == TYPE_DIR and not os.path.lexists(source):
+			logging.error("Source path not available: {0}:{1}".format(index, utf8(source)))
+			return None
+		try:
+			self.copyentry(index, type, path, source, destination)
+		except FileNotFoundError:
+			if os.path.lexists(source): raise
+			logging.error("Source path not available: {0}:{1}".format(index, utf8(source)))
+			return None
+		if not self.test: self.destinations.add(destination, type)
+
+	def ensureIndexedInodePath( self, index, source, path ):
+		"""Like `ensureInodePath`, but tolerates a vanished source, as the
+		source existence is not checked when using the destination index."""
+		try:
+			return self.ensureInodePath(source, path)
+		except FileNotFoundError:
+			if os.path.lexists(source): raise
+			logging.error("Source path not available: {0}:{1}".format(index, utf8(source)))
+			return False
+
+	def lexists( self, path ):
+		"""Tells if the given output path exists (even as a broken symlink),
+		using the destination index if any."""
+		if self.destinations is not None:
+			return self.destinations.get(path) is not None
+		return os.path.exists(path) or os.path.islink(path)
+
+	def copyentry( self, index, type, path, source, destination ):
+		"""Copies the catalogue entry with the given `index`, `type` and `path`
+		from `source` to `destination`."""
+		logging.info("Copying path [{2}] {0}:{1}".format(index,utf8(path),type))
+		if type == TYPE_DIR or os.path.isdir(source):
+			if type != TYPE_DIR: logging.warn("Source detected as directory, but typed as {0} -- {1}:{2}".format(type, index, utf8(path)))
+			self.copydir(source, destination, path)
+		elif type == TYPE_SYMLINK:
+			self.copylink(source, destination, path)
+		elif type == TYPE_FILE:
+			self.copyfile(source, destination, path)
+		else:
+			logging.error("Copy: line {0} unsupported type {1}".format(index, type, path))
+
 	def match( self, path, type ):
 		return self.filter.match(path, type) if self.filter else False
 
 	def _sync( self, index ):
 		if hasattr(self.db, "sync"):
 			self.db.sync()
+		if index is None: return
 		with open(self._indexPath, "w") as f:
 			f.write(str(index))
 
@@ -544,6 +1519,16 @@ class Copy(object):
 		"""Copies the attributes from source to destination, (re)using the
 		given `stats` info if provided."""
 		if self.test: return False
+		try:
+			self._copyattr(source, destination, stats)
+		except OSError as e:
+			# The content is already there, so we don't want to loose it
+			# because of its attributes.
+			self.fail(self.index, Errors.PHASE_ATTR, e, TYPE_FILE, source)
+			return False
+		return True
+
+	def _copyattr( self, source, destination, stats=None ):
 		s_stat = stats or os.lstat(source)
 		shutil.copystat(source, destination, follow_symlinks=False)
 		os.chown(destination, s_stat[stat.ST_GID], s_stat[stat.ST_UID], follow_symlinks=False)
@@ -586,65 +1571,550 @@ class Copy(object):
 			s_inode = s_stat[stat.ST_INO]
 			# If the destination does not exists, then we need to restore
 			# it.
-			original_path = self.getInodePath(s_inode)
-			if original_path:
-				self.hardlink(source, destination)
-			else:
+			original_path = self.getInodePath(s_inode, s_stat)
+			# The file the inode was copied to might have been removed since,
+			# in which case we copy the file again.
+			if not (original_path and self.hardlink(source, destination, s_stat)):
 				logging.info("Copying file: {0}".format(destination))
 				if self.test: return False
 				# If we haven't copied the source inode anywhere into the
 				# destination, then we copy it, preserving its attributes
-				shutil.copyfile(source, destination, follow_symlinks=False)
+				try:
+					self.copydata(source, destination)
+				except OSError:
+					# We don't want a partial file to be taken for an already
+					# copied one when resuming.
+					if os.path.lexists(destination): os.unlink(destination)
+					raise
 				# NOTE: We really don't want to have absolute paths here, we
 				# need them relative, otherwise the DB is going to explode in
 				# size.
-				self.setInodePath(s_inode, destination[len(self.output):])
+				self.setInodePath(s_inode, destination[len(self.output):], s_stat)
 				# In all cases we copy the attributes
 				self.copyattr(source, destination)
 
-	def hardlink( self, source, destination ):
+	def copydata( self, source, destination ):
+		"""Copies the contents of the given `source` file to `destination`,
+		by chunks when the throttle is active."""
+		if not self.throttle.active:
+			return shutil.copyfile(source, destination, follow_symlinks=False)
+		with open(source, "rb") as s, open(destination, "wb") as d:
+			while True:
+				started = time.time()
+				data    = s.read(self.throttle.CHUNK)
+				if not data: break
+				d.write(data)
+				self.throttle.transferred(len(data), time.time() - started)
+		return destination
+
+	def hardlink( self, source, destination, stats=None ):
 		"""Copies the file/directory as a hard link. Return True if
 		a hard link was detected."""
 		if self.test: return False
 		# Otherwise if the inode is already there, then we can
 		# simply hardlink it
-		s     = os.lstat(source)
+		s     = stats or os.lstat(source)
 		inode = s[stat.ST_INO]
 		mode  = s[stat.ST_MODE]
 		if stat.S_ISDIR(mode) or os.path.exists(destination):
 			# Directories can't have hard links
 			return False
-		original_path = self.getInodePath(inode)
+		original_path = self.getInodePath(inode, s)
 		if original_path:
 			logging.info("Hard linking file: {0}".format(destination))
-			link_source = os.path.join(self.base, original_path)
-			os.link(link_source, destination, follow_symlinks=False)
+			try:
+				os.link(original_path, destination, follow_symlinks=False)
+			except FileNotFoundError:
+				# We only copy the file when the file the inode was copied to
+				# was removed from the output since.
+				if os.path.lexists(original_path) or not os.path.exists(os.path.dirname(destination)): raise
+				logging.warn("Hard link target not found, copying instead: {0}".format(utf8(original_path)))
+				return False
 			self.copyattr(source, destination)
 			return True
 		else:
 			return False
 
-	def getInodePath( self, inode ):
-		path = self.db.get("@" + str(inode))
-		return os.path.join(self.output, path.decode("utf8")) if path else None
+	def getInodePath( self, inode, stats=None ):
+		"""Returns the output path the given source `inode` was copied to.
+		When the source's `stats` are given, the path is only returned if
+		they match the ones recorded with it, so that a reused inode is not
+		mistaken for an already copied file."""
+		value = self.db.get("@" + str(inode))
+		if not value: return None
+		fields = value.decode("utf8").split(Catalogue.FIELD_SEPARATOR, 2)
+		# Entries written by previous versions only have the path
+		if len(fields) == 3 and stats is not None and fields[:2] != self._inodeStamp(stats):
+			return None
+		return os.path.join(self.output, fields[-1])
 
-	def setInodePath( self, inode, path ):
+	def setInodePath( self, inode, path, stats=None ):
+		"""Maps the given source `inode` to the given output `path`, recording
+		the source's size and modification time when its `stats` are given.
+		The device is not recorded, as it might change when the source is
+		mounted again before resuming."""
 		if path[0] == "/": path = path[1:]
+		if stats is not None: path = Catalogue.FIELD_SEPARATOR.join(self._inodeStamp(stats) + [path])
 		self.db["@" + str(inode)] = bytes(path, "utf8")
 
+	def _inodeStamp( self, stats ):
+		return [str(stats.st_size), str(stats.st_mtime_ns)]
+
 	def ensureInodePath( self, source, path):
 		"""Ensures the the given source element path's inode is mapped to the
 		given destination's path inode."""
 		s     = os.lstat(source)
 		inode = s[stat.ST_INO]
 		mode  = s[stat.ST_MODE]
-		if not stat.S_ISDIR(mode) and not self.getInodePath(inode):
+		if not stat.S_ISDIR(mode) and not self.getInodePath(inode, s):
 			logging.info("Remapping inode for {0} to {1}".format(utf8(source), utf8(path)))
-			self.setInodePath(inode, path)
+			self.setInodePath(inode, path, s)
 			return True
 		else:
 			return False
 
+# -----------------------------------------------------------------------------
+#
+# WATCH
+#
+# -----------------------------------------------------------------------------
+
+class Inotify(object):
+	"""A minimal binding to Linux's inotify API through `ctypes`, which
+	yields the events of the watched directories as `(path, mask, cookie)`
+	triples."""
+
+	IN_MODIFY      = 0x00000002
+	IN_ATTRIB      = 0x00000004
+	IN_CLOSE_WRITE = 0x00000008
+	IN_MOVED_FROM  = 0x00000040
+	IN_MOVED_TO    = 0x00000080
+	IN_CREATE      = 0x00000100
+	IN_DELETE      = 0x00000200
+	IN_Q_OVERFLOW  = 0x00004000
+	IN_IGNORED     = 0x00008000
+	IN_ONLYDIR     = 0x01000000
+	IN_DONT_FOLLOW = 0x02000000
+	IN_ISDIR       = 0x40000000
+	IN_CLOEXEC     = 0o2000000
+	MASK           = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+	EVENT          = struct.Struct("iIII")
+	BUFFER         = 256 * 1024
+
+	def __init__( self ):
+		self.fd      = -1
+		self.watches = {}
+		if ctypes is None:
+			raise OSError(errno.ENOSYS, "ctypes is required to use inotify")
+		self._libc   = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+		if not hasattr(self._libc, "inotify_init1"):
+			raise OSError(errno.ENOSYS, "inotify is not available on this system")
+		self.fd      = self._libc.inotify_init1(self.IN_CLOEXEC)
+		if self.fd < 0: self._error("inotify_init1")
+
+	def _error( self, name, path=None ):
+		code = ctypes.get_errno()
+		raise OSError(code, "{0}: {1}".format(name, os.strerror(code)), path)
+
+	def add( self, path ):
+		"""Watches the directory at the given `path`, returning its watch
+		descriptor."""
+		wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK | self.IN_ONLYDIR | self.IN_DONT_FOLLOW)
+		if wd < 0: self._error("inotify_add_watch", path)
+		self.watches[wd] = path
+		return wd
+
+	def move( self, source, destination ):
+		"""Updates the paths of the watches at or below `source` after it was
+		moved to `destination`."""
+		prefix = source + os.sep
+		for wd, path in self.watches.items():
+			if path == source or path.startswith(prefix):
+				self.watches[wd] = destination + path[len(source):]
+
+	def read( self, timeout=None ):
+		"""Waits at most `timeout` seconds for events and yields them as
+		`(path, mask, cookie)` triples, the path being `None` when the
+		kernel's event queue overflowed."""
+		ready, _, _ = select.select([self.fd], [], [], timeout)
+		if not ready: return
+		data   = os.read(self.fd, self.BUFFER)
+		offset = 0
+		while offset < len(data):
+			wd, mask, cookie, length = self.EVENT.unpack_from(data, offset)
+			offset += self.EVENT.size
+			name    = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+			offset += length
+			root    = self.watches.get(wd)
+			if mask & self.IN_Q_OVERFLOW:
+				yield (None, mask, cookie)
+			elif mask & self.IN_IGNORED:
+				# The watched directory was removed
+				self.watches.pop(wd, None)
+			elif root is not None:
+				yield (os.path.join(root, name) if name else root, mask, cookie)
+
+	def close( self ):
+		if self.fd >= 0:
+			os.close(self.fd)
+			self.fd = -1
+
+class Watch(object):
+	"""Keeps the output of a `Copy` in sync with the source `paths` once
+	they were copied. Changes are collected from inotify and coalesced for
+	`interval` seconds, and are then applied as a batch: new entries are
+	written to a small catalogue (`__rawcopy__/watch.lst`) that is applied
+	by the copy, so that new hard links are created from the inode map,
+	modified files are rewritten in place and deleted entries are
+	removed."""
+
+	ATTR   = 1
+	DATA   = 2
+	NEW    = 3
+	DELETE = 4
+	POLL   = 0.1
+
+	def __init__( self, copy, paths, base, filter=None, interval=1.0 ):
+		self.copy     = copy
+		self.paths    = [_ for _ in paths]
+		self.base     = base
+		self.filter   = filter
+		self.interval = interval
+		self.inotify  = None
+		self.changes  = {}
+		self.moved    = {}
+		self.overflow = False
+		self.copying  = False
+		self.exhausted= False
+		self._polled  = 0.0
+		self._batchPath = os.path.join(copy.output, "__rawcopy__", "watch.lst")
+
+	def start( self ):
+		"""Subscribes to the changes of the source paths. Until `run()` is
+		called, the sources are expected to be copied: the events are then
+		only collected (see `drain()`) and applied once the copy is done."""
+		self.copying = True
+		self.inotify = Inotify()
+		try:
+			for p in self.paths:
+				if os.path.isdir(p) and not os.path.islink(p):
+					self.watchTree(p, strict=True)
+				else:
+					# Only directories can be watched, so we watch the file's
+					# parent and select its events.
+					self.watch(os.path.dirname(p), strict=True)
+		except OSError:
+			self.inotify.close()
+			raise
+		logging.info("Watch: watching {0} directories".format(len(self.inotify.watches)))
+		return self
+
+	def watch( self, path, strict=False ):
+		"""Watches the directory at the given `path`. When the watches are
+		exhausted, this raises an `OSError` if `strict`, as the sources can't
+		be kept in sync, and otherwise logs it once."""
+		try:
+			self.inotify.add(path)
+			return True
+		except OSError as e:
+			if e.errno != errno.ENOSPC:
+				logging.error("Watch: cannot watch {0}: {1}".format(utf8(path), e))
+				return True
+			message = "too many watches, raise the limit with `sysctl fs.inotify.max_user_watches=N` (currently {0})".format(self.limit())
+			if strict:
+				raise OSError(errno.ENOSPC, message, path)
+			if not self.exhausted:
+				logging.error("Watch: {0}, changes below {1} and other new directories are not mirrored".format(message, utf8(path)))
+			self.exhausted = True
+			return False
+
+	def watchTree( self, path, strict=False ):
+		"""Watches the directory at the given `path` and its descendants."""
+		for root, dirs, files in os.walk(path):
+			if not self.watch(root, strict): break
+
+	def limit( self ):
+		"""Returns the maximum number of inotify watches per user, if known."""
+		try:
+			with open("/proc/sys/fs/inotify/max_user_watches") as f:
+				return int(f.read())
+		except (OSError, ValueError):
+			return None
+
+	def isSelected( self, path ):
+		"""Tells if the given path is one of the source paths or is within one
+		of them."""
+		for p in self.paths:
+			if path == p or path.startswith(p + os.sep):
+				return True
+		return False
+
+	def run( self ):
+		"""Applies the changes to the source paths until interrupted."""
+		if not self.inotify: self.start()
+		self.copying = False
+		try:
+			while True:
+				# The changes collected during the copy are applied first
+				try:
+					self.flush()
+				except OSError as e:
+					# The sources keep changing while we apply the changes, so
+					# a failure must not stop the watch.
+					logging.error("Watch: could not apply changes: {0}".format(e))
+				self.collect()
+		except KeyboardInterrupt:
+			logging.info("Watch: interrupted, applying pending changes")
+			self.flush()
+		finally:
+			self.inotify.close()
+
+	def collect( self ):
+		"""Waits for changes and then collects them for `interval` seconds."""
+		deadline = None
+		while deadline is None or time.time() < deadline:
+			timeout = None if deadline is None else max(0, deadline - time.time())
+			for path, mask, cookie in self.inotify.read(timeout):
+				if deadline is None: deadline = time.time() + self.interval
+				self.event(path, mask, cookie)
+
+	def drain( self, *args ):
+		"""Collects the pending events without applying them, at most every
+		`POLL` seconds. This is meant to be used as the callback of the
+		copy, so that the kernel's event queue does not overflow while the
+		sources are copied."""
+		if time.time() - self._polled < self.POLL: return
+		self._polled = time.time()
+		for path, mask, cookie in self.inotify.read(0):
+			self.event(path, mask, cookie)
+
+	def event( self, path, mask, cookie ):
+		"""Registers the given inotify event."""
+		isdir = bool(mask & Inotify.IN_ISDIR)
+		if path is None:
+			logging.warn("Watch: event queue overflow, the sources will be rescanned")
+			self.overflow = True
+		elif mask & Inotify.IN_MOVED_FROM:
+			self.moved[cookie] = path
+		elif mask & Inotify.IN_MOVED_TO and cookie in self.moved:
+			self.rename(self.moved.pop(cookie), path, isdir)
+		elif mask & (Inotify.IN_CREATE | Inotify.IN_MOVED_TO):
+			self.change(path, self.NEW, isdir)
+		elif mask & Inotify.IN_DELETE:
+			self.change(path, self.DELETE)
+		elif mask & (Inotify.IN_MODIFY | Inotify.IN_CLOSE_WRITE):
+			self.change(path, self.DATA)
+		elif mask & Inotify.IN_ATTRIB:
+			self.change(path, self.ATTR)
+
+	def change( self, path, op, isdir=False ):
+		"""Registers the given operation for the given source path,
+		coalescing it with the pending one, if any."""
+		if not self.isSelected(path): return
+		if op == self.NEW and isdir:
+			self.watchTree(path)
+		current = self.changes.get(path)
+		if current == self.DELETE and op != self.DELETE:
+			# The path was deleted and then re-created
+			self.changes[path] = self.NEW
+		elif current is None or op > current:
+			self.changes[path] = op
+
+	def rename( self, source, destination, isdir=False ):
+		"""Moves the output of `source` to the output of `destination`,
+		after the pending changes were applied."""
+		self.inotify.move(source, destination)
+		if not self.isSelected(source):
+			return self.change(destination, self.NEW, isdir)
+		elif not self.isSelected(destination) or self.copying:
+			# The output can't be changed while it is being copied, so the
+			# destination is copied again instead.
+			self.change(source, self.DELETE)
+			return self.change(destination, self.NEW, isdir) if self.copying else None
+		self.flush(moved=False)
+		_, s = self.copy._destination(source)
+		_, d = self.copy._destination(destination)
+		if not os.path.lexists(s):
+			return self.change(destination, self.NEW, isdir)
+		self.copy._start(self.base)
+		try:
+			logging.info("Watch: moving {0} to {1}".format(utf8(s), utf8(d)))
+			self.remove(d)
+			os.rename(s, d)
+			self.remap(s, destination)
+		except OSError as e:
+			self.fail(Errors.PHASE_ROOT if isdir else Errors.PHASE_FILE, e, TYPE_DIR if isdir else TYPE_FILE, destination)
+		finally:
+			self.copy._close()
+
+	def fail( self, phase, error, type, path ):
+		"""Records the failure to apply a change in the copy's error list,
+		or logs it when there is none, so that the watch goes on."""
+		if self.copy.errors is None:
+			logging.error("Watch: {0} failed: {1} -- {2}".format(phase, utf8(path), error))
+		else:
+			self.copy.fail(0, phase, error, type, path)
+
+	def remap( self, previous, source ):
+		"""Updates the inode map of the files that were moved from the
+		`previous` output path to the given `source` path, so that new hard
+		links to them are still created as links."""
+		if os.path.isdir(source) and not os.path.islink(source):
+			paths = (os.path.join(root, _) for root, dirs, files in os.walk(source) for _ in files)
+		else:
+			paths = (source,)
+		for path in paths:
+			s      = os.lstat(path)
+			mapped = self.copy.getInodePath(s.st_ino, s)
+			if mapped and (mapped == previous or mapped.startswith(previous + os.sep)):
+				self.copy.setInodePath(s.st_ino, self.copy._destination(path)[0], s)
+
+	def restamp( self, source ):
+		"""Updates the size and modification time recorded in the inode map
+		for the given `source` file once its output was updated, so that new
+		hard links to it are still created as links."""
+		s = os.lstat(source)
+		self.copy.setInodePath(s.st_ino, self.copy._destination(source)[0], s)
+
+	def remove( self, path ):
+		"""Removes the given output path, whatever its type."""
+		if os.path.isdir(path) and not os.path.islink(path):
+			shutil.rmtree(path)
+		elif os.path.lexists(path):
+			os.unlink(path)
+
+	def flush( self, moved=True ):
+		"""Applies the pending changes to the output. Unless `moved` is
+		`False`, the sources that were moved out of the watched directories
+		are removed as well."""
+		if moved:
+			for path in self.moved.values():
+				self.change(path, self.DELETE)
+			self.moved = {}
+		if self.overflow:
+			# We have lost events, so we compare the sources with the
+			# output to find the changes.
+			self.overflow = False
+			self.rescan()
+		changes, self.changes = self.changes, {}
+		if not changes: return
+		logging.info("Watch: applying {0} changes".format(len(changes)))
+		if self.copy.destinations is not None:
+			self.copy.destinations.clear()
+		new = []
+		self.copy._start(self.base)
+		try:
+			for path, op in changes.items():
+				try:
+					self.apply(path, op, new)
+				except OSError as e:
+					self.fail(Errors.PHASE_FILE, e, TYPE_FILE, path)
+		finally:
+			self.copy._close()
+		if new:
+			self.copyNew(new)
+
+	def rescan( self ):
+		"""Registers the changes between the source paths and the output
+		after events were lost: the missing or differing entries are copied
+		again and the output entries that are not in the sources anymore are
+		removed. The directories that were not watched yet are watched."""
+		logging.info("Watch: rescanning the sources")
+		watched = set(self.inotify.watches.values())
+		for p in self.paths:
+			self.compare(p)
+			if not os.path.isdir(p) or os.path.islink(p): continue
+			for root, dirs, files in os.walk(p):
+				if root not in watched: self.watch(root)
+				names = dirs + files
+				for name in names:
+					self.compare(os.path.join(root, name))
+				_, destination = self.copy._destination(root)
+				try:
+					extra = set(os.listdir(destination)).difference(names)
+				except OSError:
+					extra = ()
+				for name in extra:
+					if destination == self.copy.output and name == "__rawcopy__": continue
+					self.change(os.path.join(root, name), self.DELETE)
+				# New directories are copied along with their descendants
+				dirs[:] = [_ for _ in dirs if self.changes.get(os.path.join(root, _)) != self.NEW]
+
+	def compare( self, path ):
+		"""Registers a change for the given source path when its output is
+		missing or differs in type, size, modification time, mode or symlink
+		target."""
+		_, destination = self.copy._destination(path)
+		try:
+			s = os.lstat(path)
+		except OSError:
+			return self.change(path, self.DELETE)
+		try:
+			d = os.lstat(destination)
+		except OSError:
+			return self.change(path, self.NEW, stat.S_ISDIR(s.st_mode))
+		if stat.S_IFMT(s.st_mode) != stat.S_IFMT(d.st_mode):
+			self.change(path, self.NEW, stat.S_ISDIR(s.st_mode))
+		elif stat.S_ISLNK(s.st_mode):
+			try:
+				changed = os.readlink(path) != os.readlink(destination)
+			except OSError:
+				changed = True
+			if changed: self.change(path, self.NEW)
+		elif stat.S_ISREG(s.st_mode) and (s.st_size != d.st_size or s.st_mtime_ns != d.st_mtime_ns):
+			self.change(path, self.DATA)
+		elif stat.S_IMODE(s.st_mode) != stat.S_IMODE(d.st_mode):
+			self.change(path, self.ATTR)
+
+	def apply( self, path, op, new ):
+		"""Applies the given operation for the given source path, adding the
+		path to the `new` list if it needs to be copied."""
+		_, destination = self.copy._destination(path)
+		is_dir  = lambda _:os.path.isdir(_) and not os.path.islink(_)
+		is_file = lambda _:os.path.isfile(_) and not os.path.islink(_)
+		if not os.path.lexists(path):
+			if os.path.lexists(destination):
+				logging.info("Watch: removing {0}".format(utf8(destination)))
+				self.remove(destination)
+		elif op in (self.NEW, self.DELETE) or not os.path.lexists(destination):
+			# Existing directories are merged, anything else is replaced
+			if os.path.lexists(destination) and not (is_dir(path) and is_dir(destination)):
+				self.remove(destination)
+			new.append(path)
+		elif op == self.DATA and is_file(path) and is_file(destination):
+			# The file is rewritten in place, so that its hard links in the
+			# output are updated as well.
+			logging.info("Watch: updating {0}".format(utf8(destination)))
+			self.copy.copydata(path, destination)
+			self.copy.copyattr(path, destination)
+			self.restamp(path)
+		elif is_file(path) == is_file(destination) and is_dir(path) == is_dir(destination):
+			self.copy.copyattr(path, destination)
+			if is_file(path): self.restamp(path)
+		else:
+			self.remove(destination)
+			new.append(path)
+
+	def copyNew( self, paths ):
+		"""Copies the given new source paths and their descendants through a
+		batch catalogue."""
+		selected = set()
+		for path in sorted(paths):
+			# Paths within a new directory are walked along with it
+			parent = os.path.dirname(path)
+			while parent not in selected and len(parent) > len(self.base):
+				parent = os.path.dirname(parent)
+			if parent not in selected:
+				selected.add(path)
+		catalogue = Catalogue(sorted(selected), self.base, self.filter, self.copy.errors, self.copy.throttle)
+		try:
+			with open(self._batchPath, "wb") as f:
+				catalogue.write(f)
+			self.copy.fromCatalogue(self._batchPath, resume=False)
+		except OSError as e:
+			logging.error("Watch: could not copy new entries: {0}".format(e))
+			self.copy._close()
+
 # -----------------------------------------------------------------------------
 #
 # SECTION
@@ -653,6 +2123,9 @@ class Copy(object):
 
 def run( args ):
 	sources = [os.path.abspath(_) for _ in args.source]
+	# The inode map's paths are resolved against the output, which must not
+	# depend on the current directory.
+	if args.output: args.output = os.path.abspath(args.output)
 	base    = os.path.commonprefix(sources)
 	if not os.path.exists(base) or not os.path.isdir(base): base = os.path.dirname(base)
 	for s in sources:
@@ -672,36 +2145,77 @@ def run( args ):
 		return -1
 	# Now we retrieve/create the catalogue
 	cat_path = args.catalogue or os.path.join(args.output, "__rawcopy__", "catalogue.lst")
+	# Rawcopy's files go in the output's `__rawcopy__` directory, or next to
+	# the catalogue when there is no output. In keep-going mode, failures
+	# are stored there in an error list instead of halting the run. The
+	# watch mode implies it, as the sources change while they are copied.
+	cat_dir  = os.path.join(args.output, "__rawcopy__") if args.output else os.path.dirname(os.path.abspath(cat_path))
+	errors   = Errors(os.path.join(cat_dir, "errors.lst"), retries=args.retries) if (args.keep_going or args.errors or args.watch) else None
+	# The throttle's limits can be changed at runtime by editing its control
+	# file, which is created when limits are given.
+	try:
+		throttle = Throttle(os.path.join(cat_dir, "throttle.json"),
+			bytes   = size(args.bandwidth) if args.bandwidth is not None else None,
+			ops     = args.iops,
+			latency = args.latency,
+		)
+	except ValueError as e:
+		logging.error("Unsupported bandwidth format. Expects a number of bytes optionally suffixed with K, M or G")
+		return -1
 	if not os.path.exists(cat_path):
 		logging.info("Creating source catalogue at {0}".format(cat_path))
-		c = Catalogue(sources, base, node_filter)
+		c = Catalogue(sources, base, node_filter, errors, throttle)
+		c.save(cat_path)
+	elif os.path.exists(cat_path + Catalogue.STATE_SUFFIX):
+		logging.info("Catalogue was interrupted, resuming the catalogue")
+		c = Catalogue(sources, base, node_filter, errors, throttle)
 		c.save(cat_path)
 	elif args.catalogue_only:
 		logging.info("Catalogue-only mode, regenerating the catalogue")
-		c = Catalogue(sources, base, node_filter)
+		c = Catalogue(sources, base, node_filter, errors, throttle)
 		c.save(cat_path)
+	# We parse the range and paths used to select the catalogue's items
+	r = args.range
+	if r:
+		try:
+			r = [int(_ or -1) for _ in r.split("-")]
+		except ValueError as e:
+			logging.error("Unsupported range format. Expects `start-end`")
+			return -1
+		logging.info("Using catalogue item range: {0}".format(r))
+	prefixes = args.path or None
 	# Now we iterate over the catalogue
 	if args.catalogue_only:
 		logging.info("Catalogue-only mode, skipping copy. Remove -C option to do the actual copy")
 	elif args.list:
 		# FIXME: Use a copy with no action
 		c = Copy(args.output, node_filter)
-		r = args.range
-		c.fromCatalogue(cat_path, range=r, test=True, callback=lambda i,t,p,s,d:sys.stdout.write("{0}\t{1}\t{2}\t{3}\t{4}\n".format(i,t,p,s,d)))
+		c.fromCatalogue(cat_path, range=r, test=True, prefixes=prefixes, callback=lambda i,t,p,s,d:sys.stdout.write("{0}\t{1}\t{2}\t{3}\t{4}\n".format(i,t,p,s,d)))
 	elif args.output:
 		logging.info("Copy catalogue's contents to {0}".format(args.output))
-		c = Copy(args.output, node_filter)
-		r = args.range
-		if r:
-			try:
-				r = [int(_ or -1) for _ in r.split("-")]
-			except ValueError as e:
-				logging.error("Unsupported range format. Expects `start-end`")
-				return -1
-			logging.info("Using catalogue item range: {0}".format(r))
+		c = Copy(args.output, node_filter, errors, throttle, args.index)
 		if args.test:
 			logging.info("Test mode enabled (not actual file copy)".format(r))
-		c.fromCatalogue(cat_path, range=r, test=args.test)
+		# The sources are watched before the copy so that the changes
+		# happening during the copy are not lost.
+		watched = Catalogue.normalize(base, prefixes) if prefixes else sources
+		watch = Watch(c, watched, base, node_filter, args.watch_interval) if args.watch and not args.test else None
+		if watch:
+			try:
+				watch.start()
+			except OSError as e:
+				logging.error("Cannot watch the sources: {0}".format(e))
+				return -1
+		if args.errors:
+			logging.info("Processing only the failed entries listed in {0}".format(errors.path))
+			c.fromErrors(cat_path, prefixes)
+		else:
+			c.fromCatalogue(cat_path, range=r, test=args.test, prefixes=prefixes, callback=watch.drain if watch else None)
+		if errors is not None:
+			logging.info("{0} failed entries remaining in {1}".format(len(errors), errors.path))
+		if watch:
+			logging.info("Watching the sources for changes, interrupt to stop")
+			watch.run()
 
 def command( args=None, logger=False ):
 	args = sys.argv[1:] if args is None else args
@@ -723,6 +2237,9 @@ def command( args=None, logger=False ):
 	parser.add_argument("-r", "--range", type=str,
 		help="The range of elements (by index) to copy from the catalogue as START[-END]"
 	)
+	parser.add_argument("-p", "--path", type=str, action="append",
+		help="Only processes the catalogue's entries within the given path (absolute or relative to the base), can be repeated"
+	)
 	parser.add_argument("-t", "--type", type=str, nargs="*", action="append",
 		help="Only processes the nodes of the given type ([D]irectory/[F]ile/[S]ymlink)"
 	)
@@ -735,6 +2252,33 @@ def command( args=None, logger=False ):
 	parser.add_argument("-C", "--catalogue-only", action="store_true", default=False,
 		help="Does not do any copying, simple creates the catalogue"
 	)
+	parser.add_argument("-k", "--keep-going", action="store_true", default=False,
+		help="Does not halt on errors, but records the failed entries in __rawcopy__/errors.lst"
+	)
+	parser.add_argument("-E", "--errors", action="store_true", default=False,
+		help="Only processes the failed entries recorded in __rawcopy__/errors.lst by a previous run"
+	)
+	parser.add_argument("--retries", type=int, default=3,
+		help="The number of times entries failing with a transient error are retried at the end of the run"
+	)
+	parser.add_argument("--bandwidth", type=str,
+		help="Limits the copied data to the given bytes per second (suffixed with K, M or G)"
+	)
+	parser.add_argument("--iops", type=float, default=None,
+		help="Limits the filesystem metadata operations to the given number per second"
+	)
+	parser.add_argument("--latency", type=float, default=None,
+		help="Backs off when the observed latency of operations is above the given milliseconds"
+	)
+	parser.add_argument("-I", "--index", action="store_true", default=False,
+		help="Checks the output from an in-memory index of its directories and trusts the catalogue for the sources (faster resumes)"
+	)
+	parser.add_argument("-w", "--watch", action="store_true", default=False,
+		help="Once copied, keeps the output in sync with the sources until interrupted (Linux only, implies -k)"
+	)
+	parser.add_argument("--watch-interval", type=float, default=1.0,
+		help="The number of seconds during which changes are coalesced in watch mode"
+	)
 	parser.add_argument("-l", "--list", action="store_true", default=False,
 		help="Does not do any copying, but outputs the catalogue as INDEX<TAB>TYPE<TAB>PATH"
 	)